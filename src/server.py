@@ -10,9 +10,18 @@ Owner: Person 1
 
 from dedalus_mcp import MCPServer, tool, ToolError
 import pymupdf
-import json
+import orjson
 import base64
-from typing import List, Dict
+import bisect
+import asyncio
+import functools
+import os
+import pathlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Optional, Tuple
 import re
 
 server = MCPServer(
@@ -23,6 +32,40 @@ server = MCPServer(
 )
 
 
+# PyMuPDF is not thread-safe, so all document work is serialized on one
+# worker thread; the event loop stays free to serve other requests.
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-worker")
+
+# Page-parallel work (comparative table detection) runs in worker processes
+# instead, for documents with at least _PARALLEL_MIN_PAGES text pages. main()
+# starts the pool before serving (spawning the workers takes over a second)
+# and all requests share it, so concurrent calls queue their page slices on
+# the same steady workers. Table pages cost roughly 8-45 ms each serially,
+# while a warm slice costs ~0.5 ms dispatch plus one PDF open per worker, so
+# below 8 pages the saving is a few tens of ms at best and not worth the IPC.
+_PARALLEL_MIN_PAGES = 8
+_PAGE_WORKERS = min(os.cpu_count() or 1, 6)
+_PAGE_POOL: Optional[ProcessPoolExecutor] = None
+
+# Pages are joined with a separator no search term contains, so matches never
+# span a page break; documents beyond the size cap are scanned page by page.
+# A joined extraction holds the document text three times (text, text_lower,
+# joined_lower), so the cap bounds each of the 8 cached extractions to about
+# 30M characters; that is thousands of filing pages, far past typical input.
+_PAGE_SEPARATOR = "\n\x1f\n"
+_MAX_JOINED_CHARS = 10_000_000
+
+# Plain-text extraction only: no image blocks; whitespace and mediabox
+# clipping are kept because excerpts and term offsets depend on them
+_TEXT_FLAGS = pymupdf.TEXTFLAGS_TEXT & ~pymupdf.TEXT_PRESERVE_IMAGES
+
+# Malformed filings make MuPDF print a stream of errors and warnings to stderr
+# (table detection is the worst offender); they carry nothing a tool reports,
+# so they are silenced here, which also covers the spawned page workers
+pymupdf.TOOLS.mupdf_display_errors(False)
+pymupdf.TOOLS.mupdf_display_warnings(False)
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -33,36 +76,13 @@ def get_required_sections(doc_type: str) -> List[Dict]:
     Returns required sections for each document type.
     Each section has: name, critical (bool), search_terms (list of alternatives)
     """
-    sections = {
-        "10-K": [
-            {"name": "Item 1: Business", "critical": False, "search_terms": ["item 1", "business"]},
-            {"name": "Item 1A: Risk Factors", "critical": True, "search_terms": ["item 1a", "risk factors"]},
-            {"name": "Item 7: MD&A", "critical": True, "search_terms": ["item 7", "management's discussion", "md&a"]},
-            {"name": "Item 8: Financial Statements", "critical": True, "search_terms": ["item 8", "financial statements"]},
-            {"name": "Item 9A: Controls and Procedures", "critical": True, "search_terms": ["item 9a", "controls and procedures"]},
-        ],
-        "SOX 404": [
-            {"name": "IT General Controls", "critical": True, "search_terms": ["it general controls", "itgc", "it controls"]},
-            {"name": "Access Controls", "critical": True, "search_terms": ["access controls", "access management"]},
-            {"name": "Change Management", "critical": False, "search_terms": ["change management", "change controls"]},
-            {"name": "Management Assessment", "critical": True, "search_terms": ["management assessment", "management certification"]},
-        ],
-        "8-K": [
-            {"name": "Item 1.01: Material Agreements", "critical": True, "search_terms": ["item 1.01", "material definitive agreement", "material agreement"]},
-            {"name": "Item 2.01: Acquisition/Disposition", "critical": True, "search_terms": ["item 2.01", "acquisition", "disposition of assets"]},
-            {"name": "Item 5.02: Officer Changes", "critical": False, "search_terms": ["item 5.02", "departure of directors", "officer changes"]},
-            {"name": "Item 9.01: Financial Statements/Exhibits", "critical": True, "search_terms": ["item 9.01", "financial statements and exhibits"]},
-            {"name": "Filing Timeliness", "critical": True, "search_terms": ["date of report", "date of earliest event"]},
-        ],
-        "Invoice": [
-            {"name": "Invoice Number", "critical": True, "search_terms": ["invoice number", "invoice #", "inv #", "invoice no"]},
-            {"name": "Date", "critical": True, "search_terms": ["date", "invoice date"]},
-            {"name": "Line Items", "critical": True, "search_terms": ["description", "line items", "item"]},
-            {"name": "Total", "critical": True, "search_terms": ["total", "amount due", "balance due"]},
-            {"name": "Payment Terms", "critical": False, "search_terms": ["payment terms", "due date", "net 30", "net 60"]},
-        ],
-    }
-    return sections.get(doc_type, [])
+    return _REQUIRED_SECTIONS.get(doc_type, [])
+
+
+_CURRENCY_CLEAN = re.compile(r"[^\d.]")
+_DIGIT_RE = re.compile(r"\d")
+_YEAR_RE = re.compile(r"20\d{2}")
+_ZERO_TOKENS = frozenset(["", "-", "\u2014", "\u2013", "N/A", "n/a"])
 
 
 def parse_currency(text: str) -> float:
@@ -77,24 +97,24 @@ def parse_currency(text: str) -> float:
         text = str(text).strip()
 
         # Handle empty or dash
-        if text in ["", "-", "\u2014", "\u2013", "N/A", "n/a"]:
+        if text in _ZERO_TOKENS:
             return 0.0
 
         # Check if negative (parentheses)
         is_negative = "(" in text and ")" in text
 
         # Remove non-numeric except decimal point
-        cleaned = re.sub(r"[^\d.]", "", text)
+        cleaned = _CURRENCY_CLEAN.sub("", text)
 
         if not cleaned:
             return None
 
         value = float(cleaned)
 
-        # Handle millions/thousands abbreviations
-        if "M" in text.upper() and "MANAGEMENT" not in text.upper():
+        # Handle millions/thousands abbreviations (only uppercase when needed)
+        if ("M" in text or "m" in text) and "MANAGEMENT" not in text.upper():
             value *= 1_000_000
-        elif "K" in text.upper():
+        elif "K" in text or "k" in text:
             value *= 1_000
 
         return -value if is_negative else value
@@ -103,28 +123,230 @@ def parse_currency(text: str) -> float:
         return None
 
 
-def search_text_in_pdf(doc, search_terms: List[str]) -> Dict:
+def table_to_matrix(table_data: List[List[str]]) -> List[List[float]]:
     """
-    Search for terms (case-insensitive) and return first match with context.
-    Returns: {"found": bool, "page": int, "excerpt": str}
+    Parse every value cell of a table exactly once.
+    Rows stay aligned with table_data; the label column (index 0) is None.
     """
-    for page_num, page in enumerate(doc):
-        text = page.get_text()
-        text_lower = text.lower()
+    return [[None, *map(parse_currency, row[1:])] if row else [] for row in table_data]
 
-        for term in search_terms:
-            if term.lower() in text_lower:
-                pos = text_lower.find(term.lower())
-                excerpt_start = max(0, pos - 100)
-                excerpt_end = min(len(text), pos + 200)
 
-                return {
-                    "found": True,
-                    "page": page_num + 1,
-                    "excerpt": text[excerpt_start:excerpt_end].strip(),
-                }
+def metric_label(row: List[str]) -> Optional[str]:
+    """Stripped row label of a comparative table row, or None if it is not a metric row."""
+    if not row or len(row) < 2:
+        return None
+    label = row[0]
+    metric = label.strip() if isinstance(label, str) else str(label).strip()
+    return metric if len(metric) >= 3 else None
+
+
+def header_periods(header: List[str]) -> Dict[int, int]:
+    """
+    Map each year (20xx) found in a table header row, as an int, to its
+    column index. A year repeated in a later column points at the later column.
+    """
+    cells = [cell if isinstance(cell, str) else str(cell) for cell in header]
+
+    # One scan of the whole row rules out the common no-year header; the
+    # separator is not a digit, so no match can span two cells
+    if not _YEAR_RE.search("\x1f".join(cells)):
+        return {}
+
+    period_indices = {}
+    for col_idx, cell in enumerate(cells):
+        match = _YEAR_RE.search(cell)
+        if match:
+            period_indices[int(match.group())] = col_idx
+    return period_indices
+
+
+def period_changes(
+    current: List[Optional[float]], previous: List[Optional[float]]
+) -> List[Optional[Dict]]:
+    """
+    Period-over-period change between two aligned value columns.
+    Returns one change dict per row (None where either value is missing).
+    Material: >10% change or >$100K absolute change.
+    """
+    changes = []
+    for curr_val, prev_val in zip(current, previous):
+        if curr_val is None or prev_val is None:
+            changes.append(None)
+            continue
+
+        abs_change = curr_val - prev_val
+        pct_change = (abs_change / abs(prev_val)) * 100 if prev_val != 0 else None
+        material = (
+            abs(pct_change) > 10 if pct_change is not None else False
+        ) or abs(abs_change) > 100_000
+
+        changes.append(
+            {
+                "absolute": round(abs_change, 2),
+                "percent": round(pct_change, 2) if pct_change is not None else None,
+                "material": material,
+                "direction": "increase" if abs_change > 0 else "decrease",
+            }
+        )
+    return changes
+
+
+def table_columns(rows: List[List[str]], width: int) -> List[Tuple[str, ...]]:
+    """
+    Transpose table rows into their first `width` columns in one pass.
+    Short or empty rows are padded with None, so columns stay row-aligned.
+    """
+    pad = [None] * width
+    return list(zip(*(row[:width] + pad[len(row):] if row else pad for row in rows)))
+
+
+def compile_terms(terms: List[str]) -> Tuple[str, ...]:
+    """
+    Normalize a term list for first_matches / scan_pages: lowercased and
+    de-duplicated, in first-seen order.
+    """
+    return tuple(dict.fromkeys(term.lower() for term in terms))
+
+
+def first_matches(terms: Tuple[str, ...], text_lower: str) -> Dict[str, int]:
+    """Return the first offset of every term found in lowercased text, keyed by term."""
+    found = {}
+    for term in terms:
+        pos = text_lower.find(term)
+        if pos != -1:
+            found[term] = pos
+    return found
+
+
+@dataclass(frozen=True)
+class PageTexts:
+    """
+    Cached text of one document: (text, text_lower) for every page, plus the
+    lowercase pages joined with _PAGE_SEPARATOR and each page's start offset in
+    that string, so document-wide term scans never re-join pages. Documents
+    beyond _MAX_JOINED_CHARS keep joined_lower as None and are scanned page by
+    page.
+    """
+
+    pages: Tuple[Tuple[str, str], ...]
+    joined_lower: Optional[str]
+    page_starts: Tuple[int, ...]  # plus a sentinel: where a page after the last would start
+
+    @classmethod
+    def from_pages(cls, pages: List[Tuple[str, str]]) -> "PageTexts":
+        """Index extracted (text, text_lower) pages and join them when under the cap."""
+        page_starts = []
+        offset = 0
+        for _, text_lower in pages:
+            page_starts.append(offset)
+            offset += len(text_lower) + len(_PAGE_SEPARATOR)
+        page_starts.append(offset)
+
+        joined_lower = None
+        if offset <= _MAX_JOINED_CHARS:
+            joined_lower = _PAGE_SEPARATOR.join(text_lower for _, text_lower in pages)
+        return cls(tuple(pages), joined_lower, tuple(page_starts))
+
+
+def scan_pages(terms: Tuple[str, ...], doc_text: PageTexts):
+    """
+    Yield (page_num, hits) in page order for every page containing at least one
+    term, where hits maps each term to its first offset within that page's
+    lowercased text. Each term is located with str.find over the cached joined
+    lowercase document, skipping to the next page after every hit, so finds run
+    once per term and page it occurs on.
+    """
+    joined = doc_text.joined_lower
+    if joined is None:
+        for page_num, (_, text_lower) in enumerate(doc_text.pages):
+            hits = first_matches(terms, text_lower)
+            if hits:
+                yield page_num, hits
+        return
+
+    page_starts = doc_text.page_starts
+    page_hits = {}
+    for term in terms:
+        pos = joined.find(term)
+        while pos != -1:
+            page_num = bisect.bisect_right(page_starts, pos) - 1
+            page_hits.setdefault(page_num, {})[term] = pos - page_starts[page_num]
+            pos = joined.find(term, page_starts[page_num + 1])
+
+    for page_num in sorted(page_hits):
+        yield page_num, page_hits[page_num]
+
+
+def first_page(doc_text: PageTexts, terms: Tuple[str, ...]) -> Optional[int]:
+    """
+    First page whose lowercased text contains any of terms, or None. On the
+    joined document each term's find stops at its first occurrence.
+    """
+    joined = doc_text.joined_lower
+    if joined is None:
+        for page_num, (_, text_lower) in enumerate(doc_text.pages):
+            if any(term in text_lower for term in terms):
+                return page_num
+        return None
+
+    first = min((pos for pos in map(joined.find, terms) if pos != -1), default=-1)
+    if first == -1:
+        return None
+    return bisect.bisect_right(doc_text.page_starts, first) - 1
+
+
+def search_text_in_pdf(doc_text: PageTexts, doc_type: str) -> Dict[str, Dict]:
+    """
+    Search for every required section of doc_type (case-insensitive) and
+    return the first match of each with context: the first page containing any
+    of its terms, excerpted around the first listed term present on that page.
+    Returns: {section_name: {"found": bool, "page": int, "excerpt": str}}
+    """
+    results = {}
+
+    for name, terms in _SECTION_TERMS.get(doc_type, []):
+        page_num = first_page(doc_text, terms)
+        if page_num is None:
+            results[name] = {"found": False, "page": None, "excerpt": None}
+            continue
+
+        text, text_lower = doc_text.pages[page_num]
+        pos = next(pos for pos in map(text_lower.find, terms) if pos != -1)
+        excerpt_start = max(0, pos - 100)
+        excerpt_end = min(len(text), pos + 200)
+
+        results[name] = {
+            "found": True,
+            "page": page_num + 1,
+            "excerpt": text[excerpt_start:excerpt_end].strip(),
+        }
+
+    return results
 
-    return {"found": False, "page": None, "excerpt": None}
+
+def source_mtime(pdf_path: str) -> Optional[float]:
+    """Modification time of a filesystem PDF, or None for base64 input / missing files."""
+    try:
+        return os.path.getmtime(pdf_path)
+    except (OSError, ValueError):
+        return None
+
+
+# Page workers are long-lived processes; each keeping its own copy of recent
+# PDFs would multiply resident memory, so they open files from disk instead
+_CACHE_PDF_BYTES = True
+
+
+def _init_page_worker() -> None:
+    """Page-pool process initializer: bypass the PDF byte cache in workers."""
+    global _CACHE_PDF_BYTES
+    _CACHE_PDF_BYTES = False
+
+
+@functools.lru_cache(maxsize=4)
+def _read_pdf_bytes(pdf_path: str, mtime: float) -> bytes:
+    """Read a PDF file once; cached per path + mtime so chained tool calls skip disk I/O."""
+    return pathlib.Path(pdf_path).read_bytes()
 
 
 def open_pdf(pdf_path: str):
@@ -147,34 +369,274 @@ def open_pdf(pdf_path: str):
         except Exception:
             pass  # Not valid base64, fall through to file path
 
-    # Default: treat as filesystem path
-    return pymupdf.open(pdf_path)
+    # Default: treat as filesystem path. Existing .pdf files are served from the
+    # byte cache; anything else (other formats PyMuPDF can open, missing files)
+    # goes through PyMuPDF's own path handling, which detects the file type
+    cacheable = _CACHE_PDF_BYTES and pdf_path.lower().endswith(".pdf")
+    mtime = source_mtime(pdf_path) if cacheable else None
+    if mtime is None:
+        return pymupdf.open(pdf_path)
+    return pymupdf.open(stream=_read_pdf_bytes(pdf_path, mtime), filetype="pdf")
+
+
+@functools.lru_cache(maxsize=8)
+def _extract_pages(pdf_path: str, mtime: Optional[float]) -> PageTexts:
+    """Extract (text, text_lower) for every page; cached per source + mtime."""
+    doc = open_pdf(pdf_path)
+    try:
+        pages = []
+        for page in doc:
+            text = page.get_text("text", flags=_TEXT_FLAGS, sort=False)
+            pages.append((text, text.lower()))
+        return PageTexts.from_pages(pages)
+    finally:
+        doc.close()
+
+
+def load_pdf_pages(pdf_path: str) -> PageTexts:
+    """
+    Return (text, text_lower) for every page of the PDF, extracting each page
+    only once. Results are cached so chained tool calls on the same PDF reuse
+    them; file paths are keyed by modification time so edits are picked up.
+    """
+    return _extract_pages(pdf_path, source_mtime(pdf_path))
+
+
+def dumps_json(payload: Dict) -> str:
+    """Serialize a tool response with orjson (C encoder), keeping the 2-space layout."""
+    return orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()
+
+
+async def run_blocking(func, *args):
+    """Run blocking PDF work on the shared worker thread, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, func, *args)
+
+
+def start_page_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared worker-process pool, starting it if needed. A fresh pool
+    gets one no-op task per worker so every interpreter is spawned (and has
+    imported this module) before real page work arrives.
+    """
+    global _PAGE_POOL
+    if _PAGE_POOL is None:
+        _PAGE_POOL = ProcessPoolExecutor(
+            max_workers=_PAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_page_worker,
+        )
+        for _ in range(_PAGE_WORKERS):
+            _PAGE_POOL.submit(os.getpid)
+    return _PAGE_POOL
+
+
+async def run_in_page_pool(func, *args):
+    """Run picklable page work on the shared worker-process pool."""
+    global _PAGE_POOL
+    pool = start_page_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A dead worker poisons the pool: retire it so the next call starts a
+        # fresh one, unless another request already replaced it
+        if _PAGE_POOL is pool:
+            _PAGE_POOL = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def iter_pages(doc, doc_text: PageTexts):
+    """Yield (page_num, page, text, text_lower) using the pre-extracted page text."""
+    for page_num, (page, (text, text_lower)) in enumerate(zip(doc, doc_text.pages)):
+        yield page_num, page, text, text_lower
 
 
 # ============================================================================
-# TOOL 1: FIND REGULATORY SECTIONS
+# ANALYSIS PIPELINE
 # ============================================================================
 
 
-@tool(
-    name="find_regulatory_sections",
-    description="Find required compliance sections in PDF based on document type (10-K, SOX 404, 8-K, Invoice)",
-)
-async def find_regulatory_sections(pdf_path: str, doc_type: str) -> str:
-    """Find required sections based on document type."""
+@dataclass
+class PageView:
+    """One page as seen by analyses: cached text plus lazily detected tables."""
+
+    page_num: int
+    page: pymupdf.Page
+    text: str
+    text_lower: str
+    _tables: Optional[List[List[List[str]]]] = field(default=None, repr=False)
+
+    def tables(self) -> List[List[List[str]]]:
+        """Extracted rows of every table on the page; detection runs at most once."""
+        if self._tables is None:
+            found = self.page.find_tables()
+            self._tables = [table.extract() for table in found.tables] if found and found.tables else []
+        return self._tables
+
+
+@dataclass
+class Analysis:
+    """
+    One tool's analysis, split so several can share a single pass over a PDF.
+    on_page (None for text-only analyses) sees every page; finalize receives
+    the cached page texts and returns the tool's response payload.
+    """
+
+    name: str
+    on_page: Optional[Callable[[PageView], None]]
+    finalize: Callable[[PageTexts], Dict]
+    error: str  # ToolError prefix when this analysis fails
+
+
+def run_analyses(pdf_path: str, analyses: List[Analysis]) -> Dict[str, Dict]:
+    """
+    Load the PDF once, walk its pages once and fan each page out to every
+    analysis that needs page objects. Returns {analysis.name: payload}.
+    """
+    page_analyses = [analysis for analysis in analyses if analysis.on_page]
+
     try:
-        doc = open_pdf(pdf_path)
+        doc_text = load_pdf_pages(pdf_path)
+        # Text-only analyses run entirely on the cached page texts
+        doc = open_pdf(pdf_path) if page_analyses else None
     except Exception as e:
         raise ToolError(f"Failed to open PDF: {e}")
 
+    current = None
     try:
+        if doc is not None:
+            for page_num, page, text, text_lower in iter_pages(doc, doc_text):
+                view = PageView(page_num, page, text, text_lower)
+                for current in page_analyses:
+                    current.on_page(view)
+                current = None
+
+        results = {}
+        for current in analyses:
+            results[current.name] = current.finalize(doc_text)
+        return results
+
+    except ToolError:
+        raise
+    except Exception as e:
+        prefix = current.error if current else "Failed to analyze PDF"
+        raise ToolError(f"{prefix}: {e}")
+    finally:
+        if doc is not None:
+            doc.close()
+
+
+async def analyze(pdf_path: str, analyses: List[Analysis]) -> Dict[str, Dict]:
+    """Run analyses over one PDF on the worker thread (see run_analyses)."""
+    return await run_blocking(run_analyses, pdf_path, analyses)
+
+
+# ============================================================================
+# TERM TABLES & PRECOMPUTED MATCHERS
+# ============================================================================
+
+# Required sections per document type; search_terms are alternatives
+_REQUIRED_SECTIONS = {
+    "10-K": [
+        {"name": "Item 1: Business", "critical": False, "search_terms": ["item 1", "business"]},
+        {"name": "Item 1A: Risk Factors", "critical": True, "search_terms": ["item 1a", "risk factors"]},
+        {"name": "Item 7: MD&A", "critical": True, "search_terms": ["item 7", "management's discussion", "md&a"]},
+        {"name": "Item 8: Financial Statements", "critical": True, "search_terms": ["item 8", "financial statements"]},
+        {"name": "Item 9A: Controls and Procedures", "critical": True, "search_terms": ["item 9a", "controls and procedures"]},
+    ],
+    "SOX 404": [
+        {"name": "IT General Controls", "critical": True, "search_terms": ["it general controls", "itgc", "it controls"]},
+        {"name": "Access Controls", "critical": True, "search_terms": ["access controls", "access management"]},
+        {"name": "Change Management", "critical": False, "search_terms": ["change management", "change controls"]},
+        {"name": "Management Assessment", "critical": True, "search_terms": ["management assessment", "management certification"]},
+    ],
+    "8-K": [
+        {"name": "Item 1.01: Material Agreements", "critical": True, "search_terms": ["item 1.01", "material definitive agreement", "material agreement"]},
+        {"name": "Item 2.01: Acquisition/Disposition", "critical": True, "search_terms": ["item 2.01", "acquisition", "disposition of assets"]},
+        {"name": "Item 5.02: Officer Changes", "critical": False, "search_terms": ["item 5.02", "departure of directors", "officer changes"]},
+        {"name": "Item 9.01: Financial Statements/Exhibits", "critical": True, "search_terms": ["item 9.01", "financial statements and exhibits"]},
+        {"name": "Filing Timeliness", "critical": True, "search_terms": ["date of report", "date of earliest event"]},
+    ],
+    "Invoice": [
+        {"name": "Invoice Number", "critical": True, "search_terms": ["invoice number", "invoice #", "inv #", "invoice no"]},
+        {"name": "Date", "critical": True, "search_terms": ["date", "invoice date"]},
+        {"name": "Line Items", "critical": True, "search_terms": ["description", "line items", "item"]},
+        {"name": "Total", "critical": True, "search_terms": ["total", "amount due", "balance due"]},
+        {"name": "Payment Terms", "critical": False, "search_terms": ["payment terms", "due date", "net 30", "net 60"]},
+    ],
+}
+
+# (keyword, role) pairs for text-based signature mentions
+_SIGNATURE_KEYWORDS = [
+    ("CFO", "CFO"),
+    ("CEO", "CEO"),
+    ("Chief Financial Officer", "CFO"),
+    ("Chief Executive Officer", "CEO"),
+    ("Chief Accounting Officer", "CAO"),
+    ("signed by", "Authorized Signer"),
+    ("approved by", "Approver"),
+    ("certified by", "Certifier"),
+]
+
+_RED_FLAG_PHRASES = {
+    "going concern": {"type": "going_concern", "severity": "critical"},
+    "material weakness": {"type": "material_weakness", "severity": "critical"},
+    "restatement": {"type": "restatement", "severity": "critical"},
+    "significant deficiency": {"type": "significant_deficiency", "severity": "high"},
+    "qualified opinion": {"type": "qualified_opinion", "severity": "high"},
+    "adverse opinion": {"type": "adverse_opinion", "severity": "high"},
+    "related party transaction": {"type": "related_party", "severity": "medium"},
+    "related party": {"type": "related_party", "severity": "medium"},
+    "subsequent event": {"type": "subsequent_event", "severity": "medium"},
+    "contingent liability": {"type": "contingent_liability", "severity": "medium"},
+}
+
+# Headings used to attribute a red flag to its note or section, in priority order.
+# Matched against the cached lowercase page text, like the phrases themselves.
+_CONTEXT_KEYWORDS = ["note ", "item ", "section "]
+_CONTEXT_RE = re.compile("|".join(f"({re.escape(k)})" for k in _CONTEXT_KEYWORDS))
+
+_SECTION_TERMS = {
+    doc_type: [(section["name"], compile_terms(section["search_terms"])) for section in sections]
+    for doc_type, sections in _REQUIRED_SECTIONS.items()
+}
+_SIGNATURE_TERMS = [(keyword.lower(), role) for keyword, role in _SIGNATURE_KEYWORDS]
+_SIGNATURE_MATCHER = compile_terms([keyword for keyword, _ in _SIGNATURE_KEYWORDS])
+_RED_FLAG_MATCHER = compile_terms(list(_RED_FLAG_PHRASES))
+
+# Financial statement row labels (case-insensitive substring matches)
+_KEY_ITEM_RE = re.compile(
+    r"total assets|total liabilities|total equity|stockholders|revenue|net income|net loss"
+    r"|total|subtotal|operating|investing|financing",
+    re.IGNORECASE,
+)
+_BS_ASSETS_RE = re.compile(r"total assets", re.IGNORECASE)
+_BS_LIAB_RE = re.compile(r"total liabilities", re.IGNORECASE)
+_BS_EQUITY_RE = re.compile(r"total equity|total stockholders", re.IGNORECASE)
+_IS_REVENUE_RE = re.compile(r"total revenue|net revenue", re.IGNORECASE)
+_IS_EXPENSES_RE = re.compile(r"total expenses|total operating expenses", re.IGNORECASE)
+_IS_NET_RE = re.compile(r"net income|net loss", re.IGNORECASE)
+
+
+# ============================================================================
+# TOOL 1: FIND REGULATORY SECTIONS
+# ============================================================================
+
+
+def section_analysis(doc_type: str) -> Analysis:
+    """Required-section lookup for doc_type (text only, needs no page objects)."""
+
+    def finalize(doc_text: PageTexts) -> Dict:
         required_sections = get_required_sections(doc_type)
+        results = search_text_in_pdf(doc_text, doc_type)
 
         sections_found = {}
         missing_critical = []
 
         for section in required_sections:
-            result = search_text_in_pdf(doc, section["search_terms"])
+            result = results[section["name"]]
 
             sections_found[section["name"]] = {
                 "required": True,
@@ -187,30 +649,31 @@ async def find_regulatory_sections(pdf_path: str, doc_type: str) -> str:
             if section["critical"] and not result["found"]:
                 missing_critical.append(section["name"])
 
-        doc.close()
-
         total_required = len(required_sections)
         total_found = sum(1 for s in sections_found.values() if s["found"])
 
-        return json.dumps(
-            {
-                "success": True,
-                "doc_type": doc_type,
-                "sections_found": sections_found,
-                "summary": {
-                    "total_required": total_required,
-                    "total_found": total_found,
-                    "missing_critical": missing_critical,
-                },
+        return {
+            "success": True,
+            "doc_type": doc_type,
+            "sections_found": sections_found,
+            "summary": {
+                "total_required": total_required,
+                "total_found": total_found,
+                "missing_critical": missing_critical,
             },
-            indent=2,
-        )
+        }
 
-    except ToolError:
-        raise
-    except Exception as e:
-        doc.close()
-        raise ToolError(f"Failed to find regulatory sections: {e}")
+    return Analysis("regulatory_sections", None, finalize, "Failed to find regulatory sections")
+
+
+@tool(
+    name="find_regulatory_sections",
+    description="Find required compliance sections in PDF based on document type (10-K, SOX 404, 8-K, Invoice)",
+)
+async def find_regulatory_sections(pdf_path: str, doc_type: str) -> str:
+    """Find required sections based on document type."""
+    results = await analyze(pdf_path, [section_analysis(doc_type)])
+    return dumps_json(results["regulatory_sections"])
 
 
 # ============================================================================
@@ -218,105 +681,215 @@ async def find_regulatory_sections(pdf_path: str, doc_type: str) -> str:
 # ============================================================================
 
 
+def statement_analysis() -> Analysis:
+    """Classify statement pages and extract their tables."""
+    statements = []
+
+    def on_page(view: PageView) -> None:
+        page_text = view.text_lower
+
+        # Detect statement type
+        statement_type = None
+        if "balance sheet" in page_text or "statement of financial position" in page_text:
+            statement_type = "Balance Sheet"
+        elif "income statement" in page_text or "statement of operations" in page_text or "p&l" in page_text:
+            statement_type = "Income Statement"
+        elif "cash flow" in page_text:
+            statement_type = "Cash Flow Statement"
+        elif "invoice" in page_text or "bill to" in page_text:
+            statement_type = "Invoice"
+
+        if not statement_type:
+            return
+
+        for table_data in view.tables():
+            # Look for period columns (years)
+            periods = []
+            if table_data:
+                periods = [cell.strip() for cell in map(str, table_data[0]) if _YEAR_RE.search(cell)]
+
+            # Extract key items
+            key_items = {}
+            for row in table_data[1:]:
+                if row and len(row) > 0:
+                    item_name = str(row[0]).strip()
+                    if _KEY_ITEM_RE.search(item_name):
+                        values = {}
+                        for i, period in enumerate(periods):
+                            if i + 1 < len(row):
+                                values[period] = parse_currency(row[i + 1])
+                        key_items[item_name] = values
+
+            statements.append(
+                {
+                    "type": statement_type,
+                    "page": view.page_num + 1,
+                    "periods": periods,
+                    "key_items": key_items,
+                    "table_data": table_data[:10],
+                }
+            )
+
+    def finalize(doc_text: PageTexts) -> Dict:
+        return {"success": True, "statements": statements}
+
+    return Analysis("financial_statements", on_page, finalize, "Failed to extract financial statements")
+
+
 @tool(
     name="extract_financial_statements",
     description="Extract financial statements from PDF and identify their type (Balance Sheet, Income Statement, etc.)",
 )
 async def extract_financial_statements(pdf_path: str) -> str:
     """Extract and classify financial statements."""
-    try:
-        doc = open_pdf(pdf_path)
-    except Exception as e:
-        raise ToolError(f"Failed to open PDF: {e}")
+    results = await analyze(pdf_path, [statement_analysis()])
+    return dumps_json(results["financial_statements"])
 
-    try:
-        statements = []
 
-        for page_num, page in enumerate(doc):
-            page_text = page.get_text().lower()
+# ============================================================================
+# TOOL 3: VALIDATE FINANCIAL MATH
+# ============================================================================
 
-            # Detect statement type
-            statement_type = None
-            if "balance sheet" in page_text or "statement of financial position" in page_text:
-                statement_type = "Balance Sheet"
-            elif "income statement" in page_text or "statement of operations" in page_text or "p&l" in page_text:
-                statement_type = "Income Statement"
-            elif "cash flow" in page_text:
-                statement_type = "Cash Flow Statement"
-            elif "invoice" in page_text or "bill to" in page_text:
-                statement_type = "Invoice"
-
-            if not statement_type:
-                continue
 
-            # Extract tables
-            tables = page.find_tables()
-            if not tables or not tables.tables:
-                continue
+def math_analysis() -> Analysis:
+    """Balance sheet, income statement and column-sum checks on every table."""
+    errors = []
+    warnings = []
+    tables_checked = 0
 
-            for table in tables.tables:
-                table_data = table.extract()
-
-                # Look for period columns (years)
-                periods = []
-                if table_data:
-                    header_row = table_data[0]
-                    for cell in header_row:
-                        if re.search(r"20\d{2}", str(cell)):
-                            periods.append(str(cell).strip())
-
-                # Extract key items
-                key_items = {}
-                for row in table_data[1:]:
-                    if row and len(row) > 0:
-                        item_name = str(row[0]).strip()
-                        if any(
-                            keyword in item_name.lower()
-                            for keyword in [
-                                "total assets",
-                                "total liabilities",
-                                "total equity",
-                                "stockholders",
-                                "revenue",
-                                "net income",
-                                "net loss",
-                                "total",
-                                "subtotal",
-                                "operating",
-                                "investing",
-                                "financing",
-                            ]
-                        ):
-                            values = {}
-                            for i, period in enumerate(periods):
-                                if i + 1 < len(row):
-                                    values[period] = parse_currency(row[i + 1])
-                            key_items[item_name] = values
-
-                statements.append(
-                    {
-                        "type": statement_type,
-                        "page": page_num + 1,
-                        "periods": periods,
-                        "key_items": key_items,
-                        "table_data": table_data[:10],
-                    }
-                )
+    def on_page(view: PageView) -> None:
+        nonlocal tables_checked
+        page_num = view.page_num
+        page_text = view.text_lower
 
-        doc.close()
+        # Every check needs numeric cells, so pages without digits skip table
+        # detection entirely; tables_checked only counts tables on scanned pages
+        if not _DIGIT_RE.search(page_text):
+            return
 
-        return json.dumps({"success": True, "statements": statements}, indent=2)
+        for table_num, table_data in enumerate(view.tables()):
+            tables_checked += 1
 
-    except ToolError:
-        raise
-    except Exception as e:
-        doc.close()
-        raise ToolError(f"Failed to extract financial statements: {e}")
+            if not table_data or len(table_data) < 2:
+                continue
 
+            matrix = table_to_matrix(table_data)
 
-# ============================================================================
-# TOOL 3: VALIDATE FINANCIAL MATH
-# ============================================================================
+            # Check balance sheet equation
+            if "balance sheet" in page_text or "statement of financial position" in page_text:
+                assets = None
+                liabilities = None
+                equity = None
+
+                for row, values in zip(table_data, matrix):
+                    if row and len(row) >= 2:
+                        label = str(row[0])
+                        if _BS_ASSETS_RE.search(label):
+                            assets = values[1]
+                        elif _BS_LIAB_RE.search(label):
+                            liabilities = values[1]
+                        elif _BS_EQUITY_RE.search(label):
+                            equity = values[1]
+
+                if assets and liabilities and equity:
+                    diff = abs(assets - (liabilities + equity))
+                    if diff > 0.01:
+                        errors.append(
+                            {
+                                "type": "Balance Sheet Imbalance",
+                                "page": page_num + 1,
+                                "severity": "critical",
+                                "assets": assets,
+                                "liabilities_equity": liabilities + equity,
+                                "difference": round(diff, 2),
+                                "description": (
+                                    f"Assets (${assets:,.2f}) != "
+                                    f"Liabilities + Equity (${liabilities + equity:,.2f})"
+                                ),
+                            }
+                        )
+
+            # Check income statement equation
+            if "income statement" in page_text or "statement of operations" in page_text:
+                revenue = None
+                expenses = None
+                net_income = None
+
+                for row, values in zip(table_data, matrix):
+                    if row and len(row) >= 2:
+                        label = str(row[0])
+                        if _IS_REVENUE_RE.search(label):
+                            revenue = values[1]
+                        elif _IS_EXPENSES_RE.search(label):
+                            expenses = values[1]
+                        elif _IS_NET_RE.search(label):
+                            net_income = values[1]
+
+                if revenue is not None and expenses is not None and net_income is not None:
+                    expected = revenue - expenses
+                    diff = abs(expected - net_income)
+                    if diff > 0.01:
+                        errors.append(
+                            {
+                                "type": "Income Statement Mismatch",
+                                "page": page_num + 1,
+                                "severity": "critical",
+                                "revenue": revenue,
+                                "expenses": expenses,
+                                "expected_net": round(expected, 2),
+                                "reported_net": net_income,
+                                "difference": round(diff, 2),
+                                "description": (
+                                    f"Revenue - Expenses (${expected:,.2f}) != "
+                                    f"Net Income (${net_income:,.2f})"
+                                ),
+                            }
+                        )
+
+            # Check column sums for all tables
+            if len(table_data) >= 3:
+                num_cols = len(table_data[0])
+
+                for col_idx in range(1, num_cols):
+                    numbers = [
+                        values[col_idx]
+                        for values in matrix[:-1]
+                        if col_idx < len(values) and values[col_idx] is not None
+                    ]
+
+                    if numbers:
+                        calculated_sum = sum(numbers)
+                        if col_idx < len(matrix[-1]):
+                            reported_sum = matrix[-1][col_idx]
+
+                            if reported_sum is not None and abs(calculated_sum - reported_sum) > 0.01:
+                                errors.append(
+                                    {
+                                        "type": "Column Sum Mismatch",
+                                        "page": page_num + 1,
+                                        "table_number": table_num + 1,
+                                        "column": col_idx + 1,
+                                        "calculated_sum": round(calculated_sum, 2),
+                                        "reported_sum": round(reported_sum, 2),
+                                        "difference": round(calculated_sum - reported_sum, 2),
+                                        "description": (
+                                            f"Column total mismatch: calculated "
+                                            f"${calculated_sum:,.2f}, reported ${reported_sum:,.2f}"
+                                        ),
+                                    }
+                                )
+
+    def finalize(doc_text: PageTexts) -> Dict:
+        return {
+            "success": True,
+            "validation": {
+                "tables_checked": tables_checked,
+                "errors": errors,
+                "warnings": warnings,
+            },
+        }
+
+    return Analysis("financial_math", on_page, finalize, "Failed to validate financial math")
 
 
 @tool(
@@ -325,154 +898,8 @@ async def extract_financial_statements(pdf_path: str) -> str:
 )
 async def validate_financial_math(pdf_path: str) -> str:
     """Validate financial calculations."""
-    try:
-        doc = open_pdf(pdf_path)
-    except Exception as e:
-        raise ToolError(f"Failed to open PDF: {e}")
-
-    try:
-        errors = []
-        warnings = []
-        tables_checked = 0
-
-        for page_num, page in enumerate(doc):
-            page_text = page.get_text().lower()
-            tables = page.find_tables()
-
-            if not tables or not tables.tables:
-                continue
-
-            for table_num, table in enumerate(tables.tables):
-                table_data = table.extract()
-                tables_checked += 1
-
-                if not table_data or len(table_data) < 2:
-                    continue
-
-                # Check balance sheet equation
-                if "balance sheet" in page_text or "statement of financial position" in page_text:
-                    assets = None
-                    liabilities = None
-                    equity = None
-
-                    for row in table_data:
-                        if row and len(row) >= 2:
-                            label = str(row[0]).lower()
-                            if "total assets" in label:
-                                assets = parse_currency(row[1])
-                            elif "total liabilities" in label:
-                                liabilities = parse_currency(row[1])
-                            elif "total equity" in label or "total stockholders" in label:
-                                equity = parse_currency(row[1])
-
-                    if assets and liabilities and equity:
-                        diff = abs(assets - (liabilities + equity))
-                        if diff > 0.01:
-                            errors.append(
-                                {
-                                    "type": "Balance Sheet Imbalance",
-                                    "page": page_num + 1,
-                                    "severity": "critical",
-                                    "assets": assets,
-                                    "liabilities_equity": liabilities + equity,
-                                    "difference": round(diff, 2),
-                                    "description": (
-                                        f"Assets (${assets:,.2f}) != "
-                                        f"Liabilities + Equity (${liabilities + equity:,.2f})"
-                                    ),
-                                }
-                            )
-
-                # Check income statement equation
-                if "income statement" in page_text or "statement of operations" in page_text:
-                    revenue = None
-                    expenses = None
-                    net_income = None
-
-                    for row in table_data:
-                        if row and len(row) >= 2:
-                            label = str(row[0]).lower()
-                            if "total revenue" in label or "net revenue" in label:
-                                revenue = parse_currency(row[1])
-                            elif "total expenses" in label or "total operating expenses" in label:
-                                expenses = parse_currency(row[1])
-                            elif "net income" in label or "net loss" in label:
-                                net_income = parse_currency(row[1])
-
-                    if revenue is not None and expenses is not None and net_income is not None:
-                        expected = revenue - expenses
-                        diff = abs(expected - net_income)
-                        if diff > 0.01:
-                            errors.append(
-                                {
-                                    "type": "Income Statement Mismatch",
-                                    "page": page_num + 1,
-                                    "severity": "critical",
-                                    "revenue": revenue,
-                                    "expenses": expenses,
-                                    "expected_net": round(expected, 2),
-                                    "reported_net": net_income,
-                                    "difference": round(diff, 2),
-                                    "description": (
-                                        f"Revenue - Expenses (${expected:,.2f}) != "
-                                        f"Net Income (${net_income:,.2f})"
-                                    ),
-                                }
-                            )
-
-                # Check column sums for all tables
-                if len(table_data) >= 3:
-                    num_cols = len(table_data[0])
-
-                    for col_idx in range(1, num_cols):
-                        numbers = []
-                        for row_idx in range(len(table_data) - 1):
-                            if row_idx < len(table_data) and col_idx < len(table_data[row_idx]):
-                                value = parse_currency(table_data[row_idx][col_idx])
-                                if value is not None:
-                                    numbers.append(value)
-
-                        if numbers:
-                            calculated_sum = sum(numbers)
-                            if col_idx < len(table_data[-1]):
-                                reported_sum = parse_currency(table_data[-1][col_idx])
-
-                                if reported_sum is not None and abs(calculated_sum - reported_sum) > 0.01:
-                                    errors.append(
-                                        {
-                                            "type": "Column Sum Mismatch",
-                                            "page": page_num + 1,
-                                            "table_number": table_num + 1,
-                                            "column": col_idx + 1,
-                                            "calculated_sum": round(calculated_sum, 2),
-                                            "reported_sum": round(reported_sum, 2),
-                                            "difference": round(calculated_sum - reported_sum, 2),
-                                            "description": (
-                                                f"Column total mismatch: calculated "
-                                                f"${calculated_sum:,.2f}, reported ${reported_sum:,.2f}"
-                                            ),
-                                        }
-                                    )
-
-        doc.close()
-
-        return json.dumps(
-            {
-                "success": True,
-                "validation": {
-                    "tables_checked": tables_checked,
-                    "errors": errors,
-                    "warnings": warnings,
-                },
-            },
-            indent=2,
-        )
-
-    except ToolError:
-        raise
-    except Exception as e:
-        doc.close()
-        raise ToolError(f"Failed to validate financial math: {e}")
+    results = await analyze(pdf_path, [math_analysis()])
+    return dumps_json(results["financial_math"])
 
 
 # ============================================================================
@@ -480,68 +907,54 @@ async def validate_financial_math(pdf_path: str) -> str:
 # ============================================================================
 
 
-@tool(
-    name="check_required_signatures",
-    description="Check for required signatures in PDF based on document type and amount thresholds",
-)
-async def check_required_signatures(
-    pdf_path: str, doc_type: str, invoice_amount: float = None
-) -> str:
-    """Check for required signatures."""
-    try:
-        doc = open_pdf(pdf_path)
-    except Exception as e:
-        raise ToolError(f"Failed to open PDF: {e}")
+def signature_analysis(doc_type: str, invoice_amount: float = None) -> Analysis:
+    """Digital signature fields (per page) plus text mentions of signing roles."""
+    digital_signatures = {}  # page_num -> signature field entries
+
+    def on_page(view: PageView) -> None:
+        # Check for digital signature fields
+        widgets = view.page.widgets()
+        if widgets:
+            for widget in widgets:
+                if widget.field_type == pymupdf.PDF_WIDGET_TYPE_SIGNATURE:
+                    digital_signatures.setdefault(view.page_num, []).append(
+                        {
+                            "type": "digital_signature",
+                            "signer": widget.field_name or "Unknown",
+                            "page": view.page_num + 1,
+                            "excerpt": f"Digital signature field: {widget.field_name}",
+                        }
+                    )
 
-    try:
+    def finalize(doc_text: PageTexts) -> Dict:
         found_signatures = []
+        seen = set()  # (signer, page) pairs already recorded
+        page_hits = dict(scan_pages(_SIGNATURE_MATCHER, doc_text))
 
-        for page_num, page in enumerate(doc):
-            # Check for digital signature fields
-            widgets = page.widgets()
-            if widgets:
-                for widget in widgets:
-                    if widget.field_type == pymupdf.PDF_WIDGET_TYPE_SIGNATURE:
-                        found_signatures.append(
-                            {
-                                "type": "digital_signature",
-                                "signer": widget.field_name or "Unknown",
-                                "page": page_num + 1,
-                                "excerpt": f"Digital signature field: {widget.field_name}",
-                            }
-                        )
+        for page_num, (text, _) in enumerate(doc_text.pages):
+            for signature in digital_signatures.get(page_num, []):
+                seen.add((signature["signer"], page_num + 1))
+                found_signatures.append(signature)
 
             # Check for text-based signature mentions
-            text = page.get_text()
-            signature_keywords = [
-                ("CFO", "CFO"),
-                ("CEO", "CEO"),
-                ("Chief Financial Officer", "CFO"),
-                ("Chief Executive Officer", "CEO"),
-                ("Chief Accounting Officer", "CAO"),
-                ("signed by", "Authorized Signer"),
-                ("approved by", "Approver"),
-                ("certified by", "Certifier"),
-            ]
-
-            for keyword, role in signature_keywords:
-                if keyword.lower() in text.lower():
-                    pos = text.lower().find(keyword.lower())
-                    excerpt = text[max(0, pos - 50) : min(len(text), pos + 100)]
+            hits = page_hits.get(page_num, {})
+
+            for keyword, role in _SIGNATURE_TERMS:
+                pos = hits.get(keyword)
+                if pos is not None:
+                    if (role, page_num + 1) in seen:
+                        continue
+                    seen.add((role, page_num + 1))
 
-                    already_found = any(
-                        s["signer"] == role and s["page"] == page_num + 1
-                        for s in found_signatures
+                    excerpt = text[max(0, pos - 50) : min(len(text), pos + 100)]
+                    found_signatures.append(
+                        {
+                            "type": "text_mention",
+                            "signer": role,
+                            "page": page_num + 1,
+                            "excerpt": excerpt.strip(),
+                        }
                     )
-                    if not already_found:
-                        found_signatures.append(
-                            {
-                                "type": "text_mention",
-                                "signer": role,
-                                "page": page_num + 1,
-                                "excerpt": excerpt.strip(),
-                            }
-                        )
 
         # Determine required signatures based on doc type
         required_signatures = []
@@ -557,43 +970,43 @@ async def check_required_signatures(
             else:
                 required_signatures = []
 
-        # Check which required signatures are missing
-        found_roles = [sig["signer"] for sig in found_signatures]
+        # Check which required signatures are missing. A requirement is met when any
+        # of its words appears in a found role; roles are upper-cased once and joined
+        # on a newline, which split() tokens can never contain.
+        found_roles = "\n".join({sig["signer"].upper() for sig in found_signatures})
         missing_signatures = []
 
         for required in required_signatures:
-            found = False
-            for role in found_roles:
-                if any(keyword in role.upper() for keyword in required.upper().split()):
-                    found = True
-                    break
-            if not found:
+            if not any(keyword in found_roles for keyword in required.upper().split()):
                 missing_signatures.append(required)
 
         compliance_status = "COMPLETE" if not missing_signatures else "INCOMPLETE"
 
-        doc.close()
-
-        return json.dumps(
-            {
-                "success": True,
-                "signature_requirements": {
-                    "doc_type": doc_type,
-                    "invoice_amount": invoice_amount,
-                    "required_signatures": required_signatures,
-                    "found_signatures": found_signatures,
-                    "missing_signatures": missing_signatures,
-                    "compliance_status": compliance_status,
-                },
+        return {
+            "success": True,
+            "signature_requirements": {
+                "doc_type": doc_type,
+                "invoice_amount": invoice_amount,
+                "required_signatures": required_signatures,
+                "found_signatures": found_signatures,
+                "missing_signatures": missing_signatures,
+                "compliance_status": compliance_status,
             },
-            indent=2,
-        )
+        }
 
-    except ToolError:
-        raise
-    except Exception as e:
-        doc.close()
-        raise ToolError(f"Failed to check signatures: {e}")
+    return Analysis("signatures", on_page, finalize, "Failed to check signatures")
+
+
+@tool(
+    name="check_required_signatures",
+    description="Check for required signatures in PDF based on document type and amount thresholds",
+)
+async def check_required_signatures(
+    pdf_path: str, doc_type: str, invoice_amount: float = None
+) -> str:
+    """Check for required signatures."""
+    results = await analyze(pdf_path, [signature_analysis(doc_type, invoice_amount)])
+    return dumps_json(results["signatures"])
 
 
 # ============================================================================
@@ -601,70 +1014,48 @@ async def check_required_signatures(
 # ============================================================================
 
 
-@tool(
-    name="detect_compliance_red_flags",
-    description="Search for compliance warning phrases in PDF (going concern, material weakness, etc.)",
-)
-async def detect_compliance_red_flags(pdf_path: str) -> str:
-    """Detect compliance red flags."""
-    try:
-        doc = open_pdf(pdf_path)
-    except Exception as e:
-        raise ToolError(f"Failed to open PDF: {e}")
+def red_flag_analysis() -> Analysis:
+    """Compliance warning phrases with their note/section context (text only)."""
 
-    try:
+    def finalize(doc_text: PageTexts) -> Dict:
         red_flags = []
 
-        red_flag_phrases = {
-            "going concern": {"type": "going_concern", "severity": "critical"},
-            "material weakness": {"type": "material_weakness", "severity": "critical"},
-            "restatement": {"type": "restatement", "severity": "critical"},
-            "significant deficiency": {"type": "significant_deficiency", "severity": "high"},
-            "qualified opinion": {"type": "qualified_opinion", "severity": "high"},
-            "adverse opinion": {"type": "adverse_opinion", "severity": "high"},
-            "related party transaction": {"type": "related_party", "severity": "medium"},
-            "related party": {"type": "related_party", "severity": "medium"},
-            "subsequent event": {"type": "subsequent_event", "severity": "medium"},
-            "contingent liability": {"type": "contingent_liability", "severity": "medium"},
-        }
+        for page_num, hits in scan_pages(_RED_FLAG_MATCHER, doc_text):
+            text, text_lower = doc_text.pages[page_num]
 
-        for page_num, page in enumerate(doc):
-            text = page.get_text()
-            text_lower = text.lower()
+            # Offsets of every context heading on the page, one sorted list per keyword
+            context_starts = [[] for _ in _CONTEXT_KEYWORDS]
+            for match in _CONTEXT_RE.finditer(text_lower):
+                context_starts[match.lastindex - 1].append(match.start())
 
-            for phrase, metadata in red_flag_phrases.items():
-                if phrase in text_lower:
-                    pos = text_lower.find(phrase)
+            for phrase, metadata in _RED_FLAG_PHRASES.items():
+                pos = hits.get(phrase)
+                if pos is not None:
                     excerpt = text[max(0, pos - 100) : min(len(text), pos + 300)]
 
                     # Try to determine context (which note or section)
                     context = "Unknown section"
-                    context_keywords = ["note ", "item ", "section "]
-                    for keyword in context_keywords:
-                        context_pos = text_lower.rfind(keyword, 0, pos)
-                        if context_pos != -1:
+                    for keyword, starts in zip(_CONTEXT_KEYWORDS, context_starts):
+                        # Last heading that ends before the phrase
+                        idx = bisect.bisect_right(starts, pos - len(keyword)) - 1
+                        if idx >= 0:
+                            context_pos = starts[idx]
                             context_end = text.find("\n", context_pos)
                             if context_end != -1:
                                 context = text[context_pos:context_end].strip()
                                 break
 
-                    already_flagged = any(
-                        f["phrase"] == phrase and f["page"] == page_num + 1
-                        for f in red_flags
+                    # Phrases are unique keys, so each is flagged at most once per page
+                    red_flags.append(
+                        {
+                            "phrase": phrase,
+                            "type": metadata["type"],
+                            "severity": metadata["severity"],
+                            "page": page_num + 1,
+                            "excerpt": excerpt.strip(),
+                            "context": context,
+                        }
                     )
-                    if not already_flagged:
-                        red_flags.append(
-                            {
-                                "phrase": phrase,
-                                "type": metadata["type"],
-                                "severity": metadata["severity"],
-                                "page": page_num + 1,
-                                "excerpt": excerpt.strip(),
-                                "context": context,
-                            }
-                        )
-
-        doc.close()
 
         summary = {
             "total_flags": len(red_flags),
@@ -673,16 +1064,19 @@ async def detect_compliance_red_flags(pdf_path: str) -> str:
             "medium": sum(1 for f in red_flags if f["severity"] == "medium"),
         }
 
-        return json.dumps(
-            {"success": True, "red_flags": red_flags, "summary": summary},
-            indent=2,
-        )
+        return {"success": True, "red_flags": red_flags, "summary": summary}
 
-    except ToolError:
-        raise
-    except Exception as e:
-        doc.close()
-        raise ToolError(f"Failed to detect red flags: {e}")
+    return Analysis("red_flags", None, finalize, "Failed to detect red flags")
+
+
+@tool(
+    name="detect_compliance_red_flags",
+    description="Search for compliance warning phrases in PDF (going concern, material weakness, etc.)",
+)
+async def detect_compliance_red_flags(pdf_path: str) -> str:
+    """Detect compliance red flags."""
+    results = await analyze(pdf_path, [red_flag_analysis()])
+    return dumps_json(results["red_flags"])
 
 
 # ============================================================================
@@ -690,112 +1084,210 @@ async def detect_compliance_red_flags(pdf_path: str) -> str:
 # ============================================================================
 
 
-@tool(
-    name="extract_comparative_periods",
-    description="Extract multi-period financial data and calculate period-over-period changes",
-)
-async def extract_comparative_periods(pdf_path: str) -> str:
-    """Extract multi-period financial data and calculate changes."""
-    try:
-        doc = open_pdf(pdf_path)
-    except Exception as e:
-        raise ToolError(f"Failed to open PDF: {e}")
+def _process_page_periods(doc, page_num: int) -> List[Dict]:
+    """Multi-period metrics, with period-over-period changes, from one page's tables."""
+    page = doc.load_page(page_num)
+    comparative_data = []
+
+    tables = page.find_tables()
+    if not tables or not tables.tables:
+        return comparative_data
+
+    for table in tables.tables:
+        # A header plus at least one value row, and room for two period columns
+        if table.row_count < 2 or table.col_count < 2:
+            continue
+
+        # PyMuPDF already extracted the header row while detecting the table.
+        # When the header is the table's own top row its names are exactly
+        # table_data[0], so tables without two year columns skip extract()
+        header = table.header
+        internal_header = header is not None and not header.external
+        if internal_header:
+            period_indices = header_periods(header.names)
+            if len(period_indices) < 2:
+                continue
 
-    try:
-        comparative_data = []
+        table_data = table.extract()
+        if not table_data or len(table_data) < 2:
+            continue
 
-        for page_num, page in enumerate(doc):
-            tables = page.find_tables()
-            if not tables or not tables.tables:
+        # Find period columns from header
+        if not internal_header:
+            period_indices = header_periods(table_data[0])
+            if len(period_indices) < 2:
                 continue
 
-            for table in tables.tables:
-                table_data = table.extract()
-                if not table_data or len(table_data) < 2:
-                    continue
+        sorted_periods = sorted(period_indices, reverse=True)
+
+        # Only rows with a metric label are ever reported, so the rest are
+        # dropped before any parsing, change arithmetic or rounding
+        labelled = [
+            (metric, row)
+            for row in table_data[1:]
+            if (metric := metric_label(row)) is not None
+        ]
+        if not labelled:
+            continue
+        metrics, rows = zip(*labelled)
+
+        # Transpose the value rows once, then parse each period column; cells
+        # missing from short rows come back as None, same as non-numeric cells
+        columns = table_columns(rows, max(period_indices.values()) + 1)
+        period_columns = {
+            period: list(map(parse_currency, columns[col_idx]))
+            for period, col_idx in period_indices.items()
+        }
 
-                # Find period columns from header
-                header = table_data[0]
-                period_indices = {}
-                for col_idx, cell in enumerate(header):
-                    match = re.search(r"(20\d{2})", str(cell))
-                    if match:
-                        period_indices[match.group(1)] = col_idx
+        # Changes for every adjacent period pair, computed column against column.
+        # Period and pair keys are fixed per table; both grids are transposed to
+        # one tuple per row so the row loop only zips keys with values
+        period_keys = tuple(period_columns)
+        pair_keys = tuple(
+            f"{current}_vs_{previous}"
+            for current, previous in zip(sorted_periods, sorted_periods[1:])
+        )
+        row_values = zip(*period_columns.values())
+        row_changes = zip(
+            *(
+                period_changes(period_columns[current], period_columns[previous])
+                for current, previous in zip(sorted_periods, sorted_periods[1:])
+            )
+        )
 
-                if len(period_indices) < 2:
+        if len(pair_keys) == 1:
+            # Two-period tables (the common case): a row is reported exactly
+            # when both of its values parsed, i.e. when its one change exists
+            (pair_key,) = pair_keys
+            first, second = period_keys
+            for metric, (first_val, second_val), (change,) in zip(
+                metrics, row_values, row_changes
+            ):
+                if change is None:
                     continue
+                comparative_data.append(
+                    {
+                        "metric": metric,
+                        "page": page_num + 1,
+                        "periods": {first: first_val, second: second_val},
+                        "changes": {pair_key: change},
+                    }
+                )
+            continue
 
-                sorted_periods = sorted(period_indices.keys(), reverse=True)
+        for metric, values, pair_values in zip(metrics, row_values, row_changes):
+            periods_data = {
+                period: val for period, val in zip(period_keys, values) if val is not None
+            }
+            if len(periods_data) < 2:
+                continue
 
-                for row in table_data[1:]:
-                    if not row or len(row) < 2:
-                        continue
+            changes = {
+                key: change for key, change in zip(pair_keys, pair_values) if change is not None
+            }
 
-                    metric = str(row[0]).strip()
-                    if not metric or len(metric) < 3:
-                        continue
+            if changes:
+                comparative_data.append(
+                    {
+                        "metric": metric,
+                        "page": page_num + 1,
+                        "periods": periods_data,
+                        "changes": changes,
+                    }
+                )
 
-                    periods_data = {}
-                    has_values = False
-                    for period, col_idx in period_indices.items():
-                        if col_idx < len(row):
-                            val = parse_currency(row[col_idx])
-                            if val is not None:
-                                periods_data[period] = val
-                                has_values = True
+    return comparative_data
 
-                    if not has_values or len(periods_data) < 2:
-                        continue
 
-                    changes = {}
-                    for i in range(len(sorted_periods) - 1):
-                        current = sorted_periods[i]
-                        previous = sorted_periods[i + 1]
-
-                        if current in periods_data and previous in periods_data:
-                            curr_val = periods_data[current]
-                            prev_val = periods_data[previous]
-                            abs_change = curr_val - prev_val
-                            pct_change = (
-                                ((curr_val - prev_val) / abs(prev_val)) * 100
-                                if prev_val != 0
-                                else None
-                            )
-                            material = (
-                                abs(pct_change) > 10 if pct_change is not None else False
-                            ) or abs(abs_change) > 100_000
-
-                            changes[f"{current}_vs_{previous}"] = {
-                                "absolute": round(abs_change, 2),
-                                "percent": round(pct_change, 2) if pct_change is not None else None,
-                                "material": material,
-                                "direction": "increase" if abs_change > 0 else "decrease",
-                            }
+def _encode_comparative_item(item: Dict) -> str:
+    """JSON for one comparative_data entry, indented for its place in the response."""
+    encoded = orjson.dumps(item, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return encoded.decode().replace("\n", "\n    ")
 
-                    if changes:
-                        comparative_data.append(
-                            {
-                                "metric": metric,
-                                "page": page_num + 1,
-                                "periods": periods_data,
-                                "changes": changes,
-                            }
-                        )
 
-        doc.close()
+def _process_pages(pdf_path: str, page_nums: List[int]) -> List[str]:
+    """
+    Worker entry point: open the PDF once and process the given pages.
+    Entries are encoded as soon as their page is done, so only JSON text is
+    kept (and shipped back from worker processes), never the whole dict tree.
+    """
+    with open_pdf(pdf_path) as doc:
+        encoded = []
+        for page_num in page_nums:
+            encoded.extend(map(_encode_comparative_item, _process_page_periods(doc, page_num)))
+        return encoded
 
-        return json.dumps(
-            {"success": True, "comparative_data": comparative_data},
-            indent=2,
-        )
+
+def _comparative_response(encoded: List[str]) -> str:
+    """Assemble the tool response from pre-encoded comparative_data entries."""
+    items = "[\n    " + ",\n    ".join(encoded) + "\n  ]" if encoded else "[]"
+    return f'{{\n  "success": true,\n  "comparative_data": {items}\n}}'
+
+
+@tool(
+    name="extract_comparative_periods",
+    description="Extract multi-period financial data and calculate period-over-period changes",
+)
+async def extract_comparative_periods(pdf_path: str) -> str:
+    """Extract multi-period financial data and calculate changes."""
+    try:
+        doc_text = await run_blocking(load_pdf_pages, pdf_path)
+    except Exception as e:
+        raise ToolError(f"Failed to open PDF: {e}")
+
+    try:
+        # Pages without extractable text (blank or scanned) can't yield a year
+        # header, so they never reach find_tables()
+        page_nums = [page_num for page_num, (text, _) in enumerate(doc_text.pages) if text.strip()]
+
+        if len(page_nums) < _PARALLEL_MIN_PAGES or _PAGE_WORKERS < 2:
+            comparative_data = await run_blocking(_process_pages, pdf_path, page_nums)
+        else:
+            # One contiguous slice of pages per worker: the PDF is opened once
+            # per slice, and gather() keeps the slices in page order
+            step = -(-len(page_nums) // _PAGE_WORKERS)
+            chunks = await asyncio.gather(
+                *(
+                    run_in_page_pool(_process_pages, pdf_path, page_nums[start : start + step])
+                    for start in range(0, len(page_nums), step)
+                )
+            )
+            comparative_data = [item for chunk in chunks for item in chunk]
+
+        return _comparative_response(comparative_data)
 
     except ToolError:
         raise
     except Exception as e:
-        doc.close()
         raise ToolError(f"Failed to extract comparative periods: {e}")
 
 
+# ============================================================================
+# TOOL 7: FULL COMPLIANCE REVIEW
+# ============================================================================
+
+
+@tool(
+    name="run_compliance_review",
+    description="Run section, financial statement, math, signature and red flag analysis in a single pass over the PDF",
+)
+async def run_compliance_review(
+    pdf_path: str, doc_type: str, invoice_amount: float = None
+) -> str:
+    """Run all five compliance analyses with one pass over the PDF."""
+    results = await analyze(
+        pdf_path,
+        [
+            section_analysis(doc_type),
+            statement_analysis(),
+            math_analysis(),
+            signature_analysis(doc_type, invoice_amount),
+            red_flag_analysis(),
+        ],
+    )
+    return dumps_json({"success": True, "doc_type": doc_type, "results": results})
+
+
 # ============================================================================
 # REGISTER TOOLS & RUN SERVER
 # ============================================================================
@@ -807,14 +1299,17 @@ server.collect(
     check_required_signatures,
     detect_compliance_red_flags,
     extract_comparative_periods,
+    run_compliance_review,
 )
 
 
 async def main():
+    # Spawn the page workers up front so the first large comparative request
+    # doesn't pay interpreter start-up on top of its own work
+    if _PAGE_WORKERS > 1:
+        start_page_pool()
     await server.serve(port=8080)
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())